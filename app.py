@@ -2,17 +2,17 @@
 
 import streamlit as st
 from pathlib import Path
-import time
 
 from config import (
-    DOCUMENTS_DIR, PAGE_TITLE, PAGE_ICON, LAYOUT
+    DOCUMENTS_DIR, INDEX_DIR, PAGE_TITLE, PAGE_ICON, LAYOUT,
+    CHUNK_SIZE, CHUNK_OVERLAP, MIN_CHUNK_SIZE
 )
-from src.processors.pdf_processor import load_all_documents
-from src.processors.text_chunker import chunk_documents
-from src.search.vector_store import VectorStore
-from src.search.retriever import Retriever
-from src.agent.document_agent import DocumentAgent
+from src.utils.helpers import fingerprint_directory
 
+# Heavy modules (PDF parsing, scikit-learn, anthropic) are imported inside
+# the cached stage functions, so script reruns that hit the cache skip them.
+# Every stage keeps only its latest entry: pages, indexes and agents
+# for a superseded corpus are dropped rather than held for the process life
 
 # Page configuration
 st.set_page_config(
@@ -23,34 +23,86 @@ st.set_page_config(
 )
 
 
-@st.cache_resource
+@st.cache_data(show_spinner="📄 Loading documents...", max_entries=1)
+def _load_documents(documents_dir: Path, documents_hash: str):
+    """Load PDFs; reruns only when the files in the directory change."""
+    from src.processors.pdf_processor import load_all_documents
+    
+    return load_all_documents(documents_dir)
+
+
+@st.cache_resource(show_spinner="🔍 Preparing search index...", max_entries=1)
+def _build_vector_store(corpus_hash: str, documents_hash: str):
+    """
+    Load the index saved for this corpus, or build and persist a new one.
+    
+    Returns None when there are no documents or chunks to index.
+    """
+    from src.processors.text_chunker import chunk_documents
+    from src.search.vector_store import VectorStore
+    
+    vector_store = VectorStore()
+    
+    if VectorStore.has_index(INDEX_DIR, corpus_hash):
+        vector_store.load(INDEX_DIR)
+        return vector_store
+    
+    documents = _load_documents(DOCUMENTS_DIR, documents_hash)
+    if not documents:
+        return None
+    
+    # Chunks are only needed to build the index, so they are streamed into it
+    # rather than cached: the index is itself cached for the corpus
+    vector_store.add_chunks(chunk_documents(
+        documents,
+        chunk_size=CHUNK_SIZE,
+        chunk_overlap=CHUNK_OVERLAP,
+        min_chunk_size=MIN_CHUNK_SIZE
+    ))
+    if not vector_store.is_indexed:
+        return None
+    
+    # Persist only what the sidebar needs, not the full page text
+    summaries = [_summarize_document(doc) for doc in documents]
+    vector_store.save(INDEX_DIR, corpus_hash, documents=summaries)
+    
+    return vector_store
+
+
+@st.cache_resource(show_spinner="🤖 Initializing AI agent...", max_entries=1)
+def _create_agent(corpus_hash: str, _vector_store):
+    """Create the agent; holds the Anthropic client, so it is a resource."""
+    from src.search.retriever import Retriever
+    from src.agent.document_agent import DocumentAgent
+    
+    return DocumentAgent(Retriever(_vector_store))
+
+
 def initialize_system():
     """Initialize the document intelligence system."""
-    with st.spinner("🔄 Initializing Document Intelligence System..."):
-        # Load documents
-        st.write("📄 Loading documents...")
-        documents = load_all_documents(DOCUMENTS_DIR)
-        
-        if not documents:
-            return None, None, []
-        
-        # Chunk documents
-        st.write("✂️ Creating intelligent chunks...")
-        chunks = chunk_documents(documents)
-        
-        # Build vector store
-        st.write("🔍 Building search index...")
-        vector_store = VectorStore()
-        vector_store.add_chunks(chunks)
-        
-        # Create retriever
-        retriever = Retriever(vector_store)
-        
-        # Create agent
-        st.write("🤖 Initializing AI agent...")
-        agent = DocumentAgent(retriever)
-        
-        return agent, vector_store, documents
+    documents_hash = fingerprint_directory(DOCUMENTS_DIR)
+    corpus_hash = fingerprint_directory(
+        DOCUMENTS_DIR,
+        extra=(CHUNK_SIZE, CHUNK_OVERLAP, MIN_CHUNK_SIZE)
+    )
+    
+    vector_store = _build_vector_store(corpus_hash, documents_hash)
+    if vector_store is None:
+        return None, None, []
+    
+    agent = _create_agent(corpus_hash, vector_store)
+    
+    # Sidebar metadata is saved inside the index, so it matches the chunks
+    return agent, vector_store, vector_store.documents
+
+
+def _summarize_document(doc):
+    """Reduce loaded document data to the fields shown in the sidebar."""
+    return {
+        'file_name': doc['file_name'],
+        'total_pages': doc['total_pages'],
+        'metadata': doc['metadata']
+    }
 
 
 def render_header():
@@ -92,7 +144,7 @@ def render_sidebar(agent, vector_store, documents):
             stats = vector_store.get_stats()
             col1, col2 = st.columns(2)
             col1.metric("Chunks", stats['total_chunks'])
-            col2.metric("Vocabulary", stats['vocabulary_size'])
+            col2.metric("Features", stats['n_features'])
         
         st.divider()
         
@@ -148,6 +200,7 @@ def render_query_interface(agent, mode):
 
 def process_query(agent, query, mode):
     """Process and display query results."""
+    import time
     
     # Create placeholder for status
     status_placeholder = st.empty()
@@ -156,20 +209,24 @@ def process_query(agent, query, mode):
         with st.spinner("🤔 Processing your query..."):
             start_time = time.time()
             
-            # Get response from agent
-            response = agent.process_query(query, mode=mode)
-            
-            elapsed_time = time.time() - start_time
+            # Plan and retrieve; the answer itself streams in below
+            response = agent.process_query(query, mode=mode, stream=True)
     
     # Clear status
     status_placeholder.empty()
     
-    # Display results
-    st.success(f"✅ Response generated in {elapsed_time:.2f}s")
+    # Filled in once the answer has finished streaming
+    timing_placeholder = st.empty()
     
     # Main answer
     st.markdown("### 💡 Answer")
-    st.markdown(response['answer'])
+    if 'answer_stream' in response:
+        st.write_stream(response['answer_stream'])
+    else:
+        st.markdown(response['answer'])
+    
+    elapsed_time = time.time() - start_time
+    timing_placeholder.success(f"✅ Response generated in {elapsed_time:.2f}s")
     
     # Metadata
     col1, col2, col3 = st.columns(3)
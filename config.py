@@ -36,7 +36,13 @@ MIN_CHUNK_SIZE = 100       # Minimum chunk size to keep
 # Search & Retrieval
 # ============================================================================
 MAX_SEARCH_RESULTS = 8     # Maximum chunks to retrieve
-RELEVANCE_THRESHOLD = 0.3  # Minimum relevance score
+RELEVANCE_THRESHOLD = 0.08 # Minimum cosine score in the hashed TF-IDF space
+HASH_FEATURES = 2 ** 18    # Hashed TF-IDF feature space
+INDEX_BATCH_SIZE = 4096    # Unique chunk texts vectorized per batch
+
+# Cross-encoder reranking (used when sentence-transformers is installed)
+RERANK_CANDIDATES = 50     # First-stage candidates passed to the reranker
+RERANK_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
 
 # ============================================================================
 # Agent Configuration
@@ -66,4 +72,3 @@ LAYOUT = "wide"
 # ============================================================================
 LOG_LEVEL = "INFO"
 LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
-LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
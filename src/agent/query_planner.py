@@ -1,7 +1,9 @@
 """Query planning and analysis."""
 
-from typing import Dict
+from typing import Dict, Set
+from functools import lru_cache
 import re
+import ahocorasick
 
 
 class QueryPlanner:
@@ -19,6 +21,43 @@ class QueryPlanner:
             'compare': ['compare', 'difference', 'versus', 'vs'],
             'summarize': ['summarize', 'summary', 'overview']
         }
+        self.complexity_indicators = {
+            'high': ['compare', 'analyze', 'explain', 'relationship', 'how does'],
+            'medium': ['list', 'describe', 'what are', 'tell me about'],
+            'low': ['what is', 'where', 'when', 'who']
+        }
+        self.multi_doc_indicators = [
+            'compare', 'both', 'all documents', 'across',
+            'different', 'versus', 'vs'
+        ]
+        self.stop_words = frozenset({
+            'what', 'is', 'are', 'the', 'a', 'an', 'in', 'on', 'at',
+            'to', 'for', 'of', 'with', 'by', 'from', 'about', 'tell', 'me'
+        })
+        # Length filter lives in the pattern, so no per-word len() check
+        self.word_pattern = re.compile(r'\b\w{3,}\b')
+        self.automaton = self._build_automaton()
+        
+        # Plans depend only on (query, mode), so repeated queries are free
+        self._cached_plan = lru_cache(maxsize=256)(self._build_plan)
+    
+    def _build_automaton(self) -> ahocorasick.Automaton:
+        """Compile every indicator pattern into one Aho-Corasick automaton."""
+        payloads = {}
+        for q_type, patterns in self.question_patterns.items():
+            for pattern in patterns:
+                payloads.setdefault(pattern, []).append(('query_type', q_type))
+        for level, patterns in self.complexity_indicators.items():
+            for pattern in patterns:
+                payloads.setdefault(pattern, []).append(('complexity', level))
+        for pattern in self.multi_doc_indicators:
+            payloads.setdefault(pattern, []).append(('multi_doc', pattern))
+        
+        automaton = ahocorasick.Automaton()
+        for pattern, labels in payloads.items():
+            automaton.add_word(pattern, tuple(labels))
+        automaton.make_automaton()
+        return automaton
     
     def plan(self, query: str, mode: str = "qa") -> Dict:
         """
@@ -31,19 +70,30 @@ class QueryPlanner:
         Returns:
             Execution plan dictionary
         """
+        plan = self._cached_plan(query, mode)
+        
+        # Callers get their own copy of the cached plan
+        return dict(plan, keywords=list(plan['keywords']))
+    
+    def _build_plan(self, query: str, mode: str) -> Dict:
+        """Build an execution plan; wrapped by an LRU cache in ``plan``."""
         query_lower = query.lower()
+        word_count = query.count(' ') + 1
+        
+        # Find every indicator pattern in a single pass
+        hits = self._scan(query_lower)
         
         # Detect query type
-        query_type = self._detect_query_type(query_lower)
+        query_type = self._detect_query_type(hits)
         
         # Determine complexity
-        complexity = self._assess_complexity(query)
+        complexity = self._assess_complexity(hits, word_count)
         
         # Decide number of chunks needed
         max_chunks = self._determine_chunk_count(query_type, complexity)
         
         # Extract entities/keywords
-        keywords = self._extract_keywords(query)
+        keywords = self._extract_keywords(query_lower)
         
         plan = {
             'query_type': query_type,
@@ -51,35 +101,35 @@ class QueryPlanner:
             'max_chunks': max_chunks,
             'keywords': keywords,
             'mode': mode,
-            'requires_multi_doc': self._requires_multi_document(query_lower),
+            'requires_multi_doc': self._requires_multi_document(hits),
             'requires_synthesis': complexity == 'high'
         }
         
         return plan
     
-    def _detect_query_type(self, query: str) -> str:
+    def _scan(self, query_lower: str) -> Dict[str, Set[str]]:
+        """Collect indicator labels found in the query, keyed by category."""
+        hits = {'query_type': set(), 'complexity': set(), 'multi_doc': set()}
+        for _, labels in self.automaton.iter(query_lower):
+            for category, label in labels:
+                hits[category].add(label)
+        return hits
+    
+    def _detect_query_type(self, hits: Dict[str, Set[str]]) -> str:
         """Detect the type of question."""
-        for q_type, patterns in self.question_patterns.items():
-            if any(pattern in query for pattern in patterns):
+        for q_type in self.question_patterns:
+            if q_type in hits['query_type']:
                 return q_type
         return 'general'
     
-    def _assess_complexity(self, query: str) -> str:
+    def _assess_complexity(self, hits: Dict[str, Set[str]], word_count: int) -> str:
         """Assess query complexity."""
-        indicators = {
-            'high': ['compare', 'analyze', 'explain', 'relationship', 'how does'],
-            'medium': ['list', 'describe', 'what are', 'tell me about'],
-            'low': ['what is', 'where', 'when', 'who']
-        }
-        
-        query_lower = query.lower()
-        
-        for level, patterns in indicators.items():
-            if any(pattern in query_lower for pattern in patterns):
+        for level in self.complexity_indicators:
+            if level in hits['complexity']:
                 return level
         
         # Default based on length
-        return 'high' if len(query.split()) > 10 else 'medium'
+        return 'high' if word_count > 10 else 'medium'
     
     def _determine_chunk_count(self, query_type: str, complexity: str) -> int:
         """Determine optimal number of chunks to retrieve."""
@@ -97,26 +147,18 @@ class QueryPlanner:
         
         return min(count, 10)  # Cap at 10
     
-    def _extract_keywords(self, query: str) -> list:
-        """Extract important keywords from query."""
-        # Remove common stop words
-        stop_words = {
-            'what', 'is', 'are', 'the', 'a', 'an', 'in', 'on', 'at',
-            'to', 'for', 'of', 'with', 'by', 'from', 'about', 'tell', 'me'
-        }
-        
-        words = re.findall(r'\b\w+\b', query.lower())
-        keywords = [w for w in words if w not in stop_words and len(w) > 2]
-        
-        return keywords[:10]  # Limit to top 10
+    def _extract_keywords(self, query_lower: str) -> list:
+        """Extract important keywords from the lowercased query."""
+        keywords = []
+        for match in self.word_pattern.finditer(query_lower):
+            word = match.group()
+            if word not in self.stop_words:
+                keywords.append(word)
+                if len(keywords) == 10:  # Limit to top 10
+                    break
+        
+        return keywords
     
-    def _requires_multi_document(self, query: str) -> bool:
+    def _requires_multi_document(self, hits: Dict[str, Set[str]]) -> bool:
         """Check if query requires multiple documents."""
-        multi_doc_indicators = [
-            'compare', 'both', 'all documents', 'across',
-            'different', 'versus', 'vs'
-          ]
-        
-        return any(indicator in query for indicator in multi_doc_indicators)
-        
-        return any(indicator in query for indicator in multi_doc_indicators)
+        return bool(hits['multi_doc'])
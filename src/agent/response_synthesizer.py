@@ -1,14 +1,21 @@
 """Response synthesis and formatting."""
 
 from typing import List, Dict
+import bisect
+import io
+from ..processors.text_chunker import Chunk
 
 
 class ResponseSynthesizer:
     """Synthesize responses from multiple document chunks."""
     
+    # Negated relevance thresholds (ascending) and the indicator for each band
+    _NEG_RELEVANCE_THRESHOLDS = (-0.7, -0.5, -0.3)
+    _RELEVANCE_LABELS = ("⭐⭐⭐", "⭐⭐", "⭐", "")
+    
     def build_context(
         self,
-        chunks: List[Dict],
+        chunks: List[Chunk],
         max_chars: int = 8000
     ) -> str:
         """
@@ -21,7 +28,7 @@ class ResponseSynthesizer:
         Returns:
             Formatted context string
         """
-        context_parts = []
+        buffer = io.StringIO()
         total_chars = 0
         
         # Group chunks by document
@@ -30,20 +37,24 @@ class ResponseSynthesizer:
         for doc_name, doc_chunks in chunks_by_doc.items():
             doc_context = self._format_document_context(doc_name, doc_chunks)
             
-            if total_chars + len(doc_context) > max_chars:
+            # Documents are separated by a blank line
+            needed = len(doc_context) + (2 if total_chars else 0)
+            if total_chars + needed > max_chars:
                 break
             
-            context_parts.append(doc_context)
-            total_chars += len(doc_context)
+            if total_chars:
+                buffer.write("\n\n")
+            buffer.write(doc_context)
+            total_chars += needed
         
-        return "\n\n".join(context_parts)
+        return buffer.getvalue()
     
-    def _group_by_document(self, chunks: List[Dict]) -> Dict[str, List[Dict]]:
+    def _group_by_document(self, chunks: List[Chunk]) -> Dict[str, List[Chunk]]:
         """Group chunks by source document."""
         grouped = {}
         
         for chunk in chunks:
-            doc = chunk['document']
+            doc = chunk.document
             if doc not in grouped:
                 grouped[doc] = []
             grouped[doc].append(chunk)
@@ -53,31 +64,25 @@ class ResponseSynthesizer:
     def _format_document_context(
         self,
         document_name: str,
-        chunks: List[Dict]
+        chunks: List[Chunk]
     ) -> str:
         """Format context for a single document."""
-        parts = [f"=== {document_name} ===\n"]
+        buffer = io.StringIO()
+        buffer.write(f"=== {document_name} ===\n")
         
         for chunk in chunks:
-            page_info = f"[Page {chunk['page_number']}]"
-            relevance = chunk.get('relevance_score', 0)
+            page_info = f"[Page {chunk.page_number}]"
+            relevance = chunk.relevance_score
             relevance_indicator = self._get_relevance_indicator(relevance)
             
-            parts.append(
-                f"{page_info} {relevance_indicator}\n{chunk['text']}\n"
-            )
+            buffer.write(f"\n{page_info} {relevance_indicator}\n{chunk.text}\n")
         
-        return "\n".join(parts)
+        return buffer.getvalue()
     
     def _get_relevance_indicator(self, score: float) -> str:
         """Get visual indicator of relevance."""
-        if score >= 0.7:
-            return "⭐⭐⭐"
-        elif score >= 0.5:
-            return "⭐⭐"
-        elif score >= 0.3:
-            return "⭐"
-        return ""
+        band = bisect.bisect_left(self._NEG_RELEVANCE_THRESHOLDS, -score)
+        return self._RELEVANCE_LABELS[band]
     
     def format_sources(self, sources: List[Dict]) -> str:
         """Format source citations."""
@@ -98,14 +103,14 @@ class ResponseSynthesizer:
         
         return "\n".join(formatted)
     
-    def create_summary_response(self, chunks: List[Dict]) -> str:
+    def create_summary_response(self, chunks: List[Chunk]) -> str:
         """Create a brief summary of what was found."""
         if not chunks:
             return "No relevant information found."
         
-        docs = set(chunk['document'] for chunk in chunks)
+        docs = set(chunk.document for chunk in chunks)
         total_pages = len(set(
-            (chunk['document'], chunk['page_number']) for chunk in chunks
+            (chunk.document, chunk.page_number) for chunk in chunks
         ))
         
         return f"Found {len(chunks)} relevant passages from {len(docs)} document(s) across {total_pages} pages."
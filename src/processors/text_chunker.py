@@ -1,9 +1,77 @@
 """Intelligent text chunking with semantic awareness."""
 
-from typing import List, Dict
+from typing import Iterable, Iterator, List, Dict, Tuple
+import copy
 import re
 from config import CHUNK_SIZE, CHUNK_OVERLAP, MIN_CHUNK_SIZE
 
+# Paragraph breaks: blank lines (optionally containing whitespace)
+_PARA_RE = re.compile(r'\n\s*\n|\n{2,}')
+_PARA_SUFFIX = '\n\n'
+
+
+class Chunk:
+    """A chunk of page text with its source metadata."""
+    
+    # Slots instead of a per-chunk dict keep large corpora compact
+    __slots__ = (
+        'text',
+        'text_lower',
+        'page_number',
+        'source',
+        'document',
+        'start_position',
+        'char_count',
+        'word_count',
+        'chunk_id',
+        'relevance_score'
+    )
+    
+    # Everything but the per-query relevance score is persisted
+    FIELDS = __slots__[:-1]
+    
+    def __init__(
+        self,
+        text: str,
+        page_number: int,
+        source: str,
+        start_position: int,
+        document: str = "",
+        chunk_id: int = 0
+    ):
+        self.text = text
+        self.text_lower = text.lower()  # Reused by reranking on every query
+        self.page_number = page_number
+        self.source = source
+        self.document = document
+        self.start_position = start_position
+        self.char_count = len(text)
+        self.word_count = len(text.split())
+        self.chunk_id = chunk_id
+        self.relevance_score = 0.0
+    
+    def __repr__(self) -> str:
+        return f"Chunk({self.document!r}, page={self.page_number}, chunk_id={self.chunk_id})"
+    
+    def to_fields(self) -> Tuple:
+        """Persisted field values, in ``FIELDS`` order."""
+        return tuple(getattr(self, name) for name in self.FIELDS)
+    
+    @classmethod
+    def from_fields(cls, values) -> 'Chunk':
+        """Rebuild a chunk from ``to_fields`` output without recomputing anything."""
+        chunk = cls.__new__(cls)
+        for name, value in zip(cls.FIELDS, values):
+            setattr(chunk, name, value)
+        chunk.relevance_score = 0.0
+        return chunk
+    
+    def with_score(self, score: float) -> 'Chunk':
+        """Copy of this chunk carrying a query-specific relevance score."""
+        chunk = copy.copy(self)
+        chunk.relevance_score = score
+        return chunk
+
 
 class TextChunker:
     """Smart text chunking that respects document structure."""
@@ -18,17 +86,16 @@ class TextChunker:
         self.chunk_overlap = chunk_overlap
         self.min_chunk_size = min_chunk_size
     
-    def chunk_document(self, document_data: Dict) -> List[Dict]:
+    def chunk_document(self, document_data: Dict) -> Iterator[Chunk]:
         """
         Chunk a document intelligently.
         
         Args:
             document_data: Document data from PDFProcessor
             
-        Returns:
-            List of chunks with metadata
+        Yields:
+            Chunks with metadata, in page order
         """
-        all_chunks = []
         chunk_id = 0
         
         for page_data in document_data['pages']:
@@ -39,44 +106,57 @@ class TextChunker:
             )
             
             for chunk in page_chunks:
-                chunk['chunk_id'] = chunk_id
-                chunk['document'] = document_data['file_name']
-                all_chunks.append(chunk)
+                chunk.chunk_id = chunk_id
+                chunk.document = document_data['file_name']
+                yield chunk
                 chunk_id += 1
-        
-        return all_chunks
     
-    def _chunk_page(self, text: str, page_number: int, source: str) -> List[Dict]:
+    def _chunk_page(self, text: str, page_number: int, source: str) -> List[Chunk]:
         """Chunk a single page of text."""
+        # Fast path: joined paragraphs are at most one suffix longer than the
+        # page, so a short page always becomes a single chunk
+        if len(text) + len(_PARA_SUFFIX) <= self.chunk_size:
+            return self._chunk_short_page(text, page_number, source)
+        
         chunks = []
         
         # Try to split by paragraphs first
         paragraphs = self._split_into_paragraphs(text)
         
-        current_chunk = ""
-        current_start = 0
+        # Accumulate paragraphs and join once per chunk, rather than
+        # re-copying the growing chunk on every concatenation. Each part keeps
+        # the page offsets of its paragraph text, so chunk starts are exact
+        current_parts = []
+        current_len = 0
         
-        for para in paragraphs:
+        for part in paragraphs:
+            para = part[0]
+            
             # If adding this paragraph exceeds chunk size
-            if len(current_chunk) + len(para) > self.chunk_size:
+            if current_len + len(para) > self.chunk_size:
+                current_chunk = "".join(part_text for part_text, _, _ in current_parts)
                 if current_chunk.strip():
                     chunks.append(self._create_chunk(
                         current_chunk,
                         page_number,
                         source,
-                        current_start
+                        self._parts_start(current_parts)
                     ))
                 
                 # Start new chunk with overlap
-                if len(current_chunk) > self.chunk_overlap:
+                if current_len > self.chunk_overlap:
                     overlap_text = current_chunk[-self.chunk_overlap:]
-                    current_chunk = overlap_text + para
+                    current_parts = self._tail_parts(current_parts, len(overlap_text))
+                    current_parts.append(part)
+                    current_len = len(overlap_text) + len(para)
                 else:
-                    current_chunk = para
-                
-                current_start += len(current_chunk) - self.chunk_overlap
+                    current_parts = [part]
+                    current_len = len(para)
             else:
-                current_chunk += para
+                current_parts.append(part)
+                current_len += len(para)
+        
+        current_chunk = "".join(part_text for part_text, _, _ in current_parts)
         
         # Add remaining chunk
         if len(current_chunk.strip()) >= self.min_chunk_size:
@@ -84,16 +164,87 @@ class TextChunker:
                 current_chunk,
                 page_number,
                 source,
-                current_start
+                self._parts_start(current_parts)
             ))
         
         return chunks
     
-    def _split_into_paragraphs(self, text: str) -> List[str]:
-        """Split text into paragraphs."""
+    @staticmethod
+    def _tail_parts(parts: List[Tuple[str, int, int]], length: int) -> List[Tuple[str, int, int]]:
+        """
+        Cut the last ``length`` characters of the joined parts, keeping offsets.
+        
+        Args:
+            parts: (text, start, end) tuples, where ``text[:end - start]`` is
+                the page text at ``start:end`` and the rest is separator
+            length: Characters to keep from the end
+            
+        Returns:
+            Parts whose joined text is the last ``length`` characters
+        """
+        tail = []
+        for part_text, start, end in reversed(parts):
+            if length <= 0:
+                break
+            
+            cut = max(len(part_text) - length, 0)
+            tail.append((part_text[cut:], min(start + cut, end), end))
+            length -= len(part_text)
+        
+        tail.reverse()
+        return tail
+    
+    @staticmethod
+    def _parts_start(parts: List[Tuple[str, int, int]]) -> int:
+        """Page offset of the first non-whitespace character in the parts."""
+        for part_text, start, end in parts:
+            content = part_text[:end - start]
+            if content.strip():
+                return start + len(content) - len(content.lstrip())
+        return parts[0][1] if parts else 0
+    
+    def _chunk_short_page(self, text: str, page_number: int, source: str) -> List[Chunk]:
+        """Emit a page that fits in one chunk, as the general path would."""
+        chunk_text = _PARA_SUFFIX.join(
+            stripped for stripped in map(str.strip, _PARA_RE.split(text)) if stripped
+        )
+        if len(chunk_text) < self.min_chunk_size:
+            return []
+        
+        # Offset of the first paragraph, as _split_into_paragraphs reports it
+        start = len(text) - len(text.lstrip()) if chunk_text else 0
+        return [self._create_chunk(chunk_text, page_number, source, start)]
+    
+    def _split_into_paragraphs(self, text: str) -> List[Tuple[str, int, int]]:
+        """
+        Split text into paragraphs.
+        
+        Args:
+            text: Page text
+            
+        Returns:
+            List of (paragraph, start, end) tuples, where start and end are the
+            offsets of the stripped paragraph within ``text``
+        """
+        paragraphs = []
+        cursor = 0
+        
         # Split on double newlines or multiple spaces
-        paragraphs = re.split(r'\n\s*\n|\n{2,}', text)
-        return [p.strip() + '\n\n' for p in paragraphs if p.strip()]
+        for separator in _PARA_RE.finditer(text):
+            self._append_paragraph(paragraphs, text, cursor, separator.start())
+            cursor = separator.end()
+        self._append_paragraph(paragraphs, text, cursor, len(text))
+        
+        return paragraphs
+    
+    @staticmethod
+    def _append_paragraph(paragraphs: List, text: str, start: int, end: int):
+        """Append the stripped text[start:end] with its offsets, if not blank."""
+        segment = text[start:end]
+        stripped = segment.strip()
+        if stripped:
+            start += len(segment) - len(segment.lstrip())
+            paragraphs.append((stripped + _PARA_SUFFIX, start, start + len(stripped)))
     
     def _create_chunk(
         self,
@@ -101,36 +252,34 @@ class TextChunker:
         page_number: int,
         source: str,
         start_pos: int
-    ) -> Dict:
+    ) -> Chunk:
         """Create a chunk with metadata."""
-        return {
-            'text': text.strip(),
-            'page_number': page_number,
-            'source': source,
-            'start_position': start_pos,
-            'char_count': len(text.strip()),
-            'word_count': len(text.strip().split())
-        }
+        return Chunk(text.strip(), page_number, source, start_pos)
 
 
-def chunk_documents(documents: List[Dict]) -> List[Dict]:
+def chunk_documents(
+    documents: Iterable[Dict],
+    chunk_size: int = CHUNK_SIZE,
+    chunk_overlap: int = CHUNK_OVERLAP,
+    min_chunk_size: int = MIN_CHUNK_SIZE
+) -> Iterator[Chunk]:
     """
-    Chunk all documents.
+    Chunk all documents lazily.
     
     Args:
-        documents: List of document data
+        documents: Document data
+        chunk_size: Characters per chunk
+        chunk_overlap: Overlap between chunks
+        min_chunk_size: Minimum chunk size to keep
         
-    Returns:
-        List of all chunks from all documents
+    Yields:
+        Chunks from every document, in document order
     """
-    chunker = TextChunker()
-    all_chunks = []
+    chunker = TextChunker(chunk_size, chunk_overlap, min_chunk_size)
     
     for doc in documents:
-        doc_chunks = chunker.chunk_document(doc)
-        all_chunks.extend(doc_chunks)
-        print(f"  → Created {len(doc_chunks)} chunks from {doc['file_name']}")
-    
-    return all_chunks
-    
-    return all_chunks
+        chunk_count = 0
+        for chunk in chunker.chunk_document(doc):
+            chunk_count += 1
+            yield chunk
+        print(f"  → Created {chunk_count} chunks from {doc['file_name']}")
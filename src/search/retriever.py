@@ -1,9 +1,20 @@
 """Advanced retrieval with query enhancement and reranking."""
 
-from typing import List, Dict, Tuple
+from typing import List, Set, Tuple, Sequence, Union
+import numpy as np
+import ahocorasick
 from .vector_store import VectorStore
+from ..processors.text_chunker import Chunk
 from config import MAX_SEARCH_RESULTS, RELEVANCE_THRESHOLD
 
+# Common banking/document terms added to queries that mention the key
+_ENHANCEMENTS = {
+    'address': 'address registered office location',
+    'director': 'director board member officer',
+    'kyc': 'kyc know your customer verification',
+    'document': 'document form certificate',
+}
+
 
 class Retriever:
     """Advanced retriever with query processing and result ranking."""
@@ -17,7 +28,7 @@ class Retriever:
         max_results: int = MAX_SEARCH_RESULTS,
         threshold: float = RELEVANCE_THRESHOLD,
         filter_document: str = None
-    ) -> List[Dict]:
+    ) -> List[Chunk]:
         """
         Retrieve relevant chunks for a query.
         
@@ -30,108 +41,170 @@ class Retriever:
         Returns:
             List of relevant chunks with scores
         """
-        # Enhance query
-        enhanced_query = self._enhance_query(query)
-        
-        # Search vector store
-        results = self.vector_store.search(
-            enhanced_query,
-            top_k=max_results * 2,  # Get more, then filter
-            threshold=threshold
-        )
+        return self.retrieve_batch([query], max_results, threshold, filter_document)[0]
+    
+    def retrieve_batch(
+        self,
+        queries: List[str],
+        max_results: Union[int, Sequence[int]] = MAX_SEARCH_RESULTS,
+        threshold: float = RELEVANCE_THRESHOLD,
+        filter_document: str = None
+    ) -> List[List[Chunk]]:
+        """
+        Retrieve relevant chunks for several queries at once.
         
-        # Filter by document if specified
+        Args:
+            queries: User queries
+            max_results: Maximum number of results, overall or per query
+            threshold: Minimum relevance threshold
+            filter_document: Optional document name to filter by
+            
+        Returns:
+            One list of relevant chunks per query, as from ``retrieve``
+        """
+        if not queries:
+            return []
+        
+        if isinstance(max_results, int):
+            max_results = [max_results] * len(queries)
+        
+        # Restrict the search itself to the document's chunks, so its best
+        # matches are not cut off by higher-scoring chunks from elsewhere
+        row_mask = None
         if filter_document:
-            results = [
-                (chunk, score) for chunk, score in results
-                if chunk['document'] == filter_document
-            ]
+            row_mask = self.vector_store.by_document.get(filter_document)
+            if row_mask is None:
+                return [[] for _ in queries]
+        
+        # Lowercase each query once for both enhancement and reranking
+        queries_lower = [query.lower() for query in queries]
+        enhanced_queries = [
+            self._enhance_query(query, query_lower)
+            for query, query_lower in zip(queries, queries_lower)
+        ]
         
-        # Rerank results
-        reranked = self._rerank_results(query, results)
+        # One scoring pass for every query
+        batch_results = self.vector_store.search_batch(
+            enhanced_queries,
+            top_k=max(max_results) * 2,  # Get more, then rerank
+            threshold=threshold,
+            row_mask=row_mask
+        )
+        
+        return [
+            # Candidates are sorted, so slicing matches a per-query search
+            self._finalize_results(query_lower, results[:limit * 2], limit)
+            for query_lower, results, limit in zip(queries_lower, batch_results, max_results)
+        ]
+    
+    def _finalize_results(
+        self,
+        query_lower: str,
+        results: List[Tuple[int, float]],
+        max_results: int
+    ) -> List[Chunk]:
+        """Rerank and format raw (chunk index, score) search results."""
+        chunks = self.vector_store.chunks
         
-        # Format results
-        formatted_results = []
-        for chunk, score in reranked[:max_results]:
-            chunk['relevance_score'] = score
-            formatted_results.append(chunk)
+        # Rerank results
+        reranked = self._rerank_results(query_lower, results)
         
-        return formatted_results
+        # Format results; only the chunks actually returned are copied
+        return [
+            chunks[idx].with_score(score)
+            for idx, score in reranked[:max_results]
+        ]
     
-    def _enhance_query(self, query: str) -> str:
+    def _enhance_query(self, query: str, query_lower: str) -> str:
         """
         Enhance query with synonyms and expansions.
         
         Args:
             query: Original query
+            query_lower: The query, lowercased
             
         Returns:
             Enhanced query
         """
         # Add common banking/document terms if relevant
-        enhancements = {
-            'address': 'address registered office location',
-            'director': 'director board member officer',
-            'kyc': 'kyc know your customer verification',
-            'document': 'document form certificate',
-        }
-        
-        query_lower = query.lower()
-        enhanced = query
-        
-        for key, expansion in enhancements.items():
+        for key, expansion in _ENHANCEMENTS.items():
             if key in query_lower:
-                enhanced = f"{query} {expansion}"
-                break
+                return f"{query} {expansion}"
         
-        return enhanced
+        return query
     
     def _rerank_results(
         self,
-        query: str,
-        results: List[Tuple[Dict, float]]
-    ) -> List[Tuple[Dict, float]]:
+        query_lower: str,
+        results: List[Tuple[int, float]]
+    ) -> List[Tuple[int, float]]:
         """
         Rerank results based on additional factors.
         
         Args:
-            query: Original query
-            results: Initial search results
+            query_lower: Original query, lowercased
+            results: Initial (chunk index, score) search results
             
         Returns:
-            Reranked results
+            Reranked (chunk index, score) results
         """
         if not results:
             return results
         
-        query_terms = set(query.lower().split())
+        query_terms = set(query_lower.split())
         
-        scored_results = []
-        for chunk, base_score in results:
-            # Calculate additional scoring factors
-            text_lower = chunk['text'].lower()
-            
-            # Exact phrase match bonus
-            phrase_bonus = 0.2 if query.lower() in text_lower else 0
-            
-            # Term frequency bonus
-            term_matches = sum(1 for term in query_terms if term in text_lower)
-            term_bonus = (term_matches / len(query_terms)) * 0.1
-            
-            # Length penalty (prefer more substantial chunks)
-            length_factor = min(chunk['char_count'] / 1000, 1.0) * 0.05
-            
-            # Calculate final score
-            final_score = base_score + phrase_bonus + term_bonus + length_factor
-            
-            scored_results.append((chunk, final_score))
+        # String matching stays per chunk; the scoring itself is vectorized
+        chunks = self.vector_store.chunks
+        indices = np.fromiter((idx for idx, _ in results), dtype=np.int64, count=len(results))
+        texts_lower = [chunks[idx].text_lower for idx, _ in results]
+        base_scores = np.fromiter((score for _, score in results), dtype=np.float64, count=len(results))
+        char_counts = self.vector_store.char_counts[indices].astype(np.float64)
+        phrase_hits = np.fromiter(
+            (query_lower in text for text in texts_lower), dtype=bool, count=len(results)
+        )
+        term_matches = self._count_term_matches(query_terms, texts_lower)
+        
+        # Exact phrase match bonus, term frequency bonus and length factor
+        # (prefer more substantial chunks)
+        final_scores = (
+            base_scores
+            + phrase_hits * 0.2
+            + (term_matches / max(len(query_terms), 1)) * 0.1
+            + np.minimum(char_counts / 1000, 1.0) * 0.05
+        )
         
-        # Sort by final score
-        scored_results.sort(key=lambda x: x[1], reverse=True)
+        # Sort by final score, keeping search order between ties
+        order = np.argsort(-final_scores, kind='stable')
+        return [(results[i][0], float(final_scores[i])) for i in order]
+    
+    @staticmethod
+    def _count_term_matches(terms: Set[str], texts: List[str]) -> np.ndarray:
+        """
+        Count how many distinct terms occur (as substrings) in each text.
         
-        return scored_results
+        Args:
+            terms: Lowercased query terms
+            texts: Lowercased chunk texts
+            
+        Returns:
+            int32 array with one match count per text
+        """
+        if not terms:
+            return np.zeros(len(texts), dtype=np.int32)
+        
+        # One Aho-Corasick pass per text instead of one scan per term
+        automaton = ahocorasick.Automaton()
+        for term in terms:
+            automaton.add_word(term, term)
+        automaton.make_automaton()
+        
+        return np.fromiter(
+            (len({term for _, term in automaton.iter(text)}) for text in texts),
+            dtype=np.int32,
+            count=len(texts)
+        )
     
-    def get_document_chunks(self, document_name: str) -> List[Dict]:
+    def get_document_chunks(self, document_name: str) -> List[Chunk]:
         """
         Get all chunks from a specific document.
         
@@ -141,8 +214,5 @@ class Retriever:
         Returns:
             List of chunks from that document
         """
-        return [
-            chunk for chunk in self.vector_store.chunks
-            if chunk['document'] == document_name
-            ]
-        ]
+        chunks = self.vector_store.chunks
+        return [chunks[idx] for idx in self.vector_store.by_document.get(document_name, ())]
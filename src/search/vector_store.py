@@ -1,54 +1,200 @@
 """Vector store for semantic document search using TF-IDF."""
 
-from typing import List, Dict, Tuple
+from typing import Iterable, List, Dict, Optional, Tuple
+from collections import defaultdict
 import numpy as np
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-import pickle
+from scipy.sparse import csr_matrix, vstack
+from sklearn.feature_extraction.text import HashingVectorizer, TfidfTransformer
+from sklearn.utils.extmath import row_norms
+import json
+import os
+import msgpack
+import joblib
+import shutil
+import tempfile
 from pathlib import Path
+from ..processors.text_chunker import Chunk
+from config import HASH_FEATURES, INDEX_BATCH_SIZE
+
+
+# Bump whenever the on-disk index layout changes
+INDEX_SCHEMA_VERSION = 11
+
+_CURRENT_FILE = 'CURRENT'  # Names the index directory currently in use
+_MANIFEST_FILE = 'manifest.json'
+_CHUNKS_FILE = 'chunks.msgpack'
+_DOCUMENTS_FILE = 'documents.json'
+_MODELS_FILE = 'models.joblib'
+_SCALES_FILE = 'vectors_scales.npy'
+_INVERSE_FILE = 'vectors_inverse.npy'
+_SPARSE_PARTS = ('data', 'indices', 'indptr')
+
+
+def _quantize_rows(matrix) -> Tuple[csr_matrix, np.ndarray]:
+    """
+    Quantize sparse rows to int8 with one float32 scale per row.
+    
+    Scales are chosen so each dequantized row keeps the L2 norm of the
+    original, so unit-norm TF-IDF rows stay exactly unit-norm.
+    
+    Args:
+        matrix: Sparse float matrix
+        
+    Returns:
+        (int8 matrix, scales) such that ``int8[i] * scales[i]`` ~= ``matrix[i]``
+    """
+    matrix = csr_matrix(matrix, dtype=np.float32)
+    
+    scales = abs(matrix).max(axis=1).toarray().ravel() / 127.0
+    scales[scales == 0] = 1.0
+    
+    row_scales = np.repeat(scales, np.diff(matrix.indptr))
+    quantized = csr_matrix(
+        (np.rint(matrix.data / row_scales).astype(np.int8), matrix.indices, matrix.indptr),
+        shape=matrix.shape
+    )
+    
+    quantized_norms = row_norms(quantized.astype(np.float32))
+    nonzero = quantized_norms > 0
+    scales[nonzero] = row_norms(matrix)[nonzero] / quantized_norms[nonzero]
+    return quantized, scales.astype(np.float32)
+
+
+def _current_index_dir(path: Path) -> Optional[Path]:
+    """Resolve the index directory the ``CURRENT`` pointer under ``path`` names."""
+    try:
+        name = (path / _CURRENT_FILE).read_text().strip()
+    except OSError:
+        return None
+    
+    index_dir = path / name
+    return index_dir if name and index_dir.is_dir() else None
 
 
 class VectorStore:
     """In-memory vector store using TF-IDF for semantic search."""
     
     def __init__(self):
-        self.chunks: List[Dict] = []
-        self.vectorizer = TfidfVectorizer(
-            max_features=1000,
+        self.chunks: List[Chunk] = []
+        # Stateless hashing keeps no vocabulary; only the IDF weights are fitted
+        self.vectorizer = HashingVectorizer(
+            n_features=HASH_FEATURES,
             stop_words='english',
-            ngram_range=(1, 2)
+            ngram_range=(1, 2),
+            alternate_sign=False,
+            norm=None,
+            dtype=np.float32
         )
-        self.vectors = None
+        self.tfidf = TfidfTransformer()
+        self.vectors = None  # int8, dequantized by self.scales per row
+        self.scales = None
+        self.inverse = None  # Row of self.vectors for each chunk
+        self._members = None  # Chunk indices grouped by row...
+        self._member_offsets = None  # ...and where each row's group starts
+        self.by_document: Dict[str, np.ndarray] = {}  # Chunk indices per document
+        self.char_counts = None  # Column of chunk lengths, for vectorized reranking
+        self.documents: List[Dict] = []  # Per-document metadata saved with the index
         self.is_indexed = False
     
-    def add_chunks(self, chunks: List[Dict]):
+    def add_chunks(self, chunks: Iterable[Chunk], batch_size: int = INDEX_BATCH_SIZE):
         """
         Add chunks to the vector store.
         
+        Chunks may come from a generator; their texts are hashed into term
+        counts batch by batch, so no list of every text is built up.
+        
         Args:
-            chunks: List of document chunks
+            chunks: Document chunks
+            batch_size: Unique texts vectorized per batch
         """
-        self.chunks = chunks
-        self._build_index()
-    
-    def _build_index(self):
-        """Build the vector index."""
+        self.chunks = []
+        rows = {}
+        inverse = []
+        batch = []
+        count_batches = []
+        
+        for chunk in chunks:
+            self.chunks.append(chunk)
+            
+            # Repeated texts (headers, footers, boilerplate) share one vector row
+            row = rows.get(chunk.text)
+            if row is None:
+                row = rows[chunk.text] = len(rows)
+                batch.append(chunk.text)
+                if len(batch) >= batch_size:
+                    count_batches.append(self.vectorizer.transform(batch))
+                    batch = []
+            inverse.append(row)
+        
+        if batch:
+            count_batches.append(self.vectorizer.transform(batch))
+        
         if not self.chunks:
             return
         
-        # Extract text from chunks
-        texts = [chunk['text'] for chunk in self.chunks]
+        self.inverse = np.asarray(inverse, dtype=np.int64)
+        self._build_index(vstack(count_batches, format='csr'))
+    
+    def _build_index(self, counts: csr_matrix):
+        """Build the vector index from the term counts of each unique text."""
+        self._group_members()
+        self._index_metadata()
         
-        # Build TF-IDF vectors
-        self.vectors = self.vectorizer.fit_transform(texts)
+        # Stateless hashing made the counts in one pass; only IDF is fitted
+        vectors = self.tfidf.fit_transform(counts)
+        self.vectors, self.scales = _quantize_rows(vectors)
         self.is_indexed = True
     
+    def _group_members(self):
+        """Group chunk indices by the vector row they share."""
+        self._members = np.argsort(self.inverse, kind='stable')
+        counts = np.bincount(self.inverse, minlength=int(self.inverse.max()) + 1)
+        self._member_offsets = np.concatenate(([0], np.cumsum(counts)))
+    
+    def _index_metadata(self):
+        """Group chunk indices by document and collect per-chunk columns."""
+        by_document = defaultdict(list)
+        for idx, chunk in enumerate(self.chunks):
+            by_document[chunk.document].append(idx)
+        
+        self.by_document = {
+            document: np.asarray(indices, dtype=np.int64)
+            for document, indices in by_document.items()
+        }
+        self.char_counts = np.fromiter(
+            (chunk.char_count for chunk in self.chunks), dtype=np.int32, count=len(self.chunks)
+        )
+    
+    def _expand_rows(self, rows: np.ndarray, scores: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Map scored vector rows back to every chunk sharing them.
+        
+        Args:
+            rows: Vector row indices
+            scores: Score of each row
+            
+        Returns:
+            (chunk indices, scores) with each row's score repeated per chunk
+        """
+        starts = self._member_offsets[rows]
+        lengths = self._member_offsets[rows + 1] - starts
+        
+        # Positions starts[i] .. starts[i] + lengths[i] - 1 for every row, flattened
+        group_starts = np.repeat(np.cumsum(lengths) - lengths, lengths)
+        positions = np.repeat(starts, lengths) + np.arange(lengths.sum()) - group_starts
+        return self._members[positions], np.repeat(scores, lengths)
+    
+    def _vectorize(self, texts: List[str]) -> csr_matrix:
+        """Map texts to L2-normalized TF-IDF rows."""
+        return self.tfidf.transform(self.vectorizer.transform(texts))
+    
     def search(
         self,
         query: str,
         top_k: int = 5,
-        threshold: float = 0.0
-    ) -> List[Tuple[Dict, float]]:
+        threshold: float = 0.0,
+        row_mask: Optional[np.ndarray] = None
+    ) -> List[Tuple[int, float]]:
         """
         Search for relevant chunks.
         
@@ -56,58 +202,262 @@ class VectorStore:
             query: Search query
             top_k: Number of results to return
             threshold: Minimum similarity threshold
+            row_mask: Optional chunk indices to restrict the search to
             
         Returns:
-            List of (chunk, similarity_score) tuples
+            List of (chunk index, similarity_score) tuples; look chunks up in
+            ``self.chunks``
+        """
+        return self.search_batch(
+            [query], top_k=top_k, threshold=threshold, row_mask=row_mask
+        )[0]
+    
+    def search_batch(
+        self,
+        queries: List[str],
+        top_k: int = 5,
+        threshold: float = 0.0,
+        row_mask: Optional[np.ndarray] = None
+    ) -> List[List[Tuple[int, float]]]:
+        """
+        Search for several queries with a single similarity computation.
+        
+        Args:
+            queries: Search queries
+            top_k: Number of results to return per query
+            threshold: Minimum similarity threshold
+            row_mask: Optional chunk indices (e.g. from ``by_document``) to
+                restrict the search to
+            
+        Returns:
+            One list of (chunk index, similarity_score) tuples per query
         """
         if not self.is_indexed:
-            return []
+            return [[] for _ in queries]
         
-        # Vectorize query
-        query_vector = self.vectorizer.transform([query])
+        # Vectorize queries and score them against every chunk at once
+        query_vectors = self._vectorize(queries)
+        k = min(top_k, len(self.chunks) if row_mask is None else len(row_mask))
+        if k <= 0:
+            return [[] for _ in queries]
         
-        # Calculate similarities
-        similarities = cosine_similarity(query_vector, self.vectors)[0]
+        top_scores, top_indices = self._search_exact(query_vectors, k, row_mask)
         
-        # Get top results
-        top_indices = np.argsort(similarities)[::-1][:top_k]
+        return [
+            [
+                (int(idx), float(similarity))
+                for idx, similarity in zip(indices, scores)
+                if similarity >= threshold
+            ]
+            for scores, indices in zip(top_scores, top_indices)
+        ]
+    
+    def _search_exact(
+        self,
+        query_vectors,
+        k: int,
+        row_mask: Optional[np.ndarray] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Score queries against every (or every masked) chunk; returns sorted (scores, indices)."""
+        if row_mask is None:
+            rows_subset = allowed = None
+            similarities = self._score(query_vectors, self.vectors, self.scales)
+        else:
+            # Only score the vector rows behind the masked chunks
+            rows_subset = np.unique(self.inverse[row_mask])
+            allowed = np.zeros(len(self.chunks), dtype=bool)
+            allowed[row_mask] = True
+            similarities = self._score(
+                query_vectors, self.vectors[rows_subset], self.scales[rows_subset]
+            )
         
-        results = []
-        for idx in top_indices:
-            similarity = similarities[idx]
-            if similarity >= threshold:
-                chunk = self.chunks[idx].copy()
-                results.append((chunk, float(similarity)))
+        top_scores = np.zeros((similarities.shape[0], k), dtype=np.float32)
+        top_indices = np.empty((similarities.shape[0], k), dtype=np.int64)
+        for row in range(similarities.shape[0]):
+            # Only rows sharing a term with the query have a stored score;
+            # partition those instead of sorting a dense row of every chunk
+            start, end = similarities.indptr[row], similarities.indptr[row + 1]
+            rows = similarities.indices[start:end]
+            scores = similarities.data[start:end]
+            if rows_subset is not None:
+                rows = rows_subset[rows]
+            if len(scores) > k:
+                top = np.argpartition(-scores, k - 1)[:k]
+                rows, scores = rows[top], scores[top]
+            
+            # Every row covers at least one (masked) chunk, so the top k rows
+            # hold the top k chunks; only those few rows are expanded
+            indices, scores = self._expand_rows(rows, scores)
+            if allowed is not None:
+                keep = allowed[indices]
+                indices, scores = indices[keep], scores[keep]
+            
+            # Ties (e.g. duplicate texts) are kept in chunk order
+            order = np.lexsort((indices, -scores))[:k]
+            n = len(order)
+            top_scores[row, :n] = scores[order]
+            top_indices[row, :n] = indices[order]
+            
+            # Pad with zero-similarity chunks when too few share a term
+            if n < k:
+                pool = np.arange(k + n) if row_mask is None else row_mask[:k + n]
+                unmatched = np.setdiff1d(pool, indices)
+                top_indices[row, n:] = unmatched[:k - n]
         
-        return results
+        return top_scores, top_indices
     
-    def save(self, path: Path):
-        """Save the vector store to disk."""
-        data = {
-            'chunks': self.chunks,
-            'vectorizer': self.vectorizer,
-            'vectors': self.vectors
+    @staticmethod
+    def _score(query_vectors, vectors, scales) -> csr_matrix:
+        """Sparse cosine similarities between query rows and quantized chunk rows."""
+        # Integer dot products (accumulated in int32), rescaled to cosine;
+        # quantized rows and queries keep the unit norm of their TF-IDF rows.
+        # Multiplying the index by the transposed queries reads its CSR arrays
+        # in place; only the small (chunks x queries) result is transposed
+        query_int8, query_scales = _quantize_rows(query_vectors)
+        dots = csr_matrix((vectors @ query_int8.astype(np.int32).T).T)
+        
+        row_scales = np.repeat(query_scales, np.diff(dots.indptr))
+        data = dots.data * row_scales * np.asarray(scales)[dots.indices]
+        return csr_matrix((data.astype(np.float32), dots.indices, dots.indptr), shape=dots.shape)
+    
+    def save(
+        self,
+        path: Path,
+        corpus_hash: str = "",
+        documents: Optional[List[Dict]] = None
+    ):
+        """
+        Save the vector store under an index root directory.
+        
+        The sparse TF-IDF matrix is written as raw ``.npy`` arrays so that
+        ``load`` can memory-map it, and chunk metadata as msgpack; only the
+        fitted IDF weights go through joblib. Files of a loaded index may
+        still be mapped, so they are never rewritten: each save goes to a
+        fresh directory, and the ``CURRENT`` pointer is swapped to it
+        atomically once every file is in place. Document metadata is saved
+        in the same directory, so it always matches the chunks it is loaded
+        with.
+        
+        Args:
+            path: Index root directory
+            corpus_hash: Fingerprint of the corpus the index was built from
+            documents: Optional per-document metadata (e.g. for display)
+        
+        Raises:
+            ValueError: If no chunks have been indexed
+        """
+        if not self.is_indexed:
+            raise ValueError("Cannot save an empty vector store")
+        
+        if documents is not None:
+            self.documents = documents
+        
+        path.mkdir(parents=True, exist_ok=True)
+        previous = _current_index_dir(path)
+        target = Path(tempfile.mkdtemp(prefix='index-', dir=path))
+        
+        vectors = csr_matrix(self.vectors)
+        for part in _SPARSE_PARTS:
+            np.save(target / f'vectors_{part}.npy', getattr(vectors, part), allow_pickle=False)
+        np.save(target / _SCALES_FILE, self.scales, allow_pickle=False)
+        np.save(target / _INVERSE_FILE, self.inverse, allow_pickle=False)
+        
+        with open(target / _CHUNKS_FILE, 'wb', buffering=1 << 20) as f:
+            f.write(msgpack.packb([chunk.to_fields() for chunk in self.chunks], use_bin_type=True))
+        
+        joblib.dump({'tfidf': self.tfidf}, target / _MODELS_FILE, compress=3)
+        
+        (target / _DOCUMENTS_FILE).write_text(json.dumps(self.documents, indent=2))
+        
+        manifest = {
+            'schema_version': INDEX_SCHEMA_VERSION,
+            'corpus_hash': corpus_hash,
+            'n_features': self.vectorizer.n_features,
+            'total_chunks': len(self.chunks),
+            'shape': list(vectors.shape)
         }
+        (target / _MANIFEST_FILE).write_text(json.dumps(manifest, indent=2))
+        
+        # Until this replace, readers keep seeing the previous index
+        fd, pointer = tempfile.mkstemp(prefix=f'{_CURRENT_FILE}-', dir=path)
+        with os.fdopen(fd, 'w') as f:
+            f.write(target.name)
+        os.replace(pointer, path / _CURRENT_FILE)
         
-        with open(path, 'wb') as f:
-            pickle.dump(data, f)
+        # Stores that mapped the old files keep them alive until they unmap
+        # (where the OS refuses to delete mapped files, they are left behind)
+        if previous is not None and previous != target:
+            shutil.rmtree(previous, ignore_errors=True)
     
     def load(self, path: Path):
-        """Load the vector store from disk."""
-        with open(path, 'rb') as f:
-            data = pickle.load(f)
+        """Load the vector store from the current index under a root directory."""
+        index_dir = _current_index_dir(path)
+        if index_dir is None:
+            raise FileNotFoundError(f"No saved index under {path}")
+        
+        manifest = json.loads((index_dir / _MANIFEST_FILE).read_text())
+        
+        with open(index_dir / _CHUNKS_FILE, 'rb') as f:
+            self.chunks = [
+                Chunk.from_fields(fields)
+                for fields in msgpack.unpackb(f.read(), raw=False, use_list=False)
+            ]
+        
+        models = joblib.load(index_dir / _MODELS_FILE)
+        self.tfidf = models['tfidf']
         
-        self.chunks = data['chunks']
-        self.vectorizer = data['vectorizer']
-        self.vectors = data['vectors']
+        self.documents = json.loads((index_dir / _DOCUMENTS_FILE).read_text())
+        
+        parts = tuple(
+            np.load(index_dir / f'vectors_{part}.npy', mmap_mode='r')
+            for part in _SPARSE_PARTS
+        )
+        
+        self.vectors = csr_matrix(parts, shape=tuple(manifest['shape']), copy=False)
+        self.scales = np.load(index_dir / _SCALES_FILE, mmap_mode='r')
+        self.inverse = np.load(index_dir / _INVERSE_FILE, mmap_mode='r')
+        self._group_members()
+        self._index_metadata()
         self.is_indexed = True
     
+    @staticmethod
+    def has_index(path: Path, corpus_hash: str) -> bool:
+        """
+        Check whether a saved index exists for the given corpus.
+        
+        Args:
+            path: Index root directory
+            corpus_hash: Fingerprint of the current corpus
+            
+        Returns:
+            True if the saved index matches the corpus, schema version and
+            hashed feature space
+        """
+        index_dir = _current_index_dir(path)
+        if index_dir is None:
+            return False
+        
+        manifest_path = index_dir / _MANIFEST_FILE
+        if not manifest_path.exists():
+            return False
+        
+        try:
+            manifest = json.loads(manifest_path.read_text())
+        except (OSError, ValueError):
+            return False
+        
+        return (
+            manifest.get('schema_version') == INDEX_SCHEMA_VERSION
+            and manifest.get('corpus_hash') == corpus_hash
+            and manifest.get('n_features') == HASH_FEATURES
+        )
+    
     def get_stats(self) -> Dict:
         """Get statistics about the vector store."""
         return {
             'total_chunks': len(self.chunks),
+            'unique_chunks': self.vectors.shape[0] if self.is_indexed else 0,
             'is_indexed': self.is_indexed,
-            'vocabulary_size': len(self.vectorizer.vocabulary_) if self.is_indexed else 0,
-            'documents': len(set(chunk['document'] for chunk in self.chunks))
-        }
+            'n_features': self.vectorizer.n_features,
+            'documents': len(self.by_document)
         }
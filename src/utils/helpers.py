@@ -1 +1,31 @@
+"""Shared helper utilities."""
 
+import hashlib
+from pathlib import Path
+
+
+def fingerprint_directory(
+    directory: Path,
+    pattern: str = "*.pdf",
+    extra: tuple = ()
+) -> str:
+    """
+    Fingerprint the files in a directory without reading their contents.
+
+    Args:
+        directory: Directory to fingerprint
+        pattern: Glob pattern selecting the files to include
+        extra: Additional values (e.g. chunking settings) mixed into the hash
+
+    Returns:
+        Hex digest that changes whenever a file is added, removed or modified
+    """
+    entries = []
+    if directory.exists():
+        for file_path in directory.glob(pattern):
+            stat = file_path.stat()
+            entries.append((file_path.name, stat.st_size, stat.st_mtime_ns))
+
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(repr((sorted(entries), tuple(extra))).encode())
+    return digest.hexdigest()
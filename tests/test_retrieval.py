@@ -0,0 +1,91 @@
+"""Retrieval checks against a small prose corpus."""
+
+import pytest
+
+from src.processors.text_chunker import chunk_documents
+from src.search.retriever import Retriever
+from src.search.vector_store import VectorStore
+
+
+# One page per topic, written like the policy documents the app indexes
+_PAGES = {
+    'kyc_policy.pdf': [
+        "Customers must complete know your customer verification before an account "
+        "is opened. The bank collects a government issued photo identity document, "
+        "proof of residential address such as a recent utility bill, and the "
+        "customer's tax identification number. Verification is repeated whenever "
+        "the customer's risk rating changes.",
+        "Enhanced due diligence applies to politically exposed persons and to "
+        "customers from high risk jurisdictions. The compliance officer reviews the "
+        "source of funds and approves the relationship before any transaction is "
+        "processed. Records of the review are retained for at least five years.",
+    ],
+    'company_profile.pdf': [
+        "The company's registered office is located at 14 Harbour Street, Leeds. "
+        "All statutory correspondence should be sent to this address. The company "
+        "also operates branch offices in Manchester and Bristol, which handle "
+        "customer enquiries during normal business hours.",
+        "The board of directors consists of five members. The chief executive "
+        "officer and the finance director are executive directors, and three "
+        "independent non-executive directors chair the audit, risk and "
+        "remuneration committees. Directors are elected at the annual general "
+        "meeting for a term of three years.",
+    ],
+    'loan_terms.pdf': [
+        "Personal loans are available from one thousand to twenty five thousand "
+        "pounds over a term of one to seven years. Interest is charged at a fixed "
+        "annual rate agreed when the loan is approved, and repayments are collected "
+        "monthly by direct debit from the borrower's current account.",
+        "Borrowers may repay the loan early at any time. An early repayment charge "
+        "of up to fifty eight days of interest applies when more than eight "
+        "thousand pounds is repaid within a twelve month period. Missed repayments "
+        "are reported to credit reference agencies.",
+    ],
+    'data_protection.pdf': [
+        "Personal data is processed only for the purposes stated in this privacy "
+        "notice. Customers can request a copy of the personal information held "
+        "about them, ask for inaccurate data to be corrected, and object to direct "
+        "marketing at any time by contacting the data protection officer.",
+        "Data is stored on servers located in the United Kingdom and encrypted both "
+        "in transit and at rest. Access is restricted to staff who need it for "
+        "their role, and every access is logged and audited each quarter.",
+    ],
+}
+
+_QUERIES = [
+    ('What documents are needed for know your customer verification?', 'kyc_policy.pdf'),
+    ('Who approves politically exposed persons?', 'kyc_policy.pdf'),
+    ('Where is the registered office?', 'company_profile.pdf'),
+    ('How many directors are on the board?', 'company_profile.pdf'),
+    ('What is the interest rate on personal loans?', 'loan_terms.pdf'),
+    ('Is there a charge for repaying a loan early?', 'loan_terms.pdf'),
+    ('How can I get a copy of my personal data?', 'data_protection.pdf'),
+    ('Where is customer data stored?', 'data_protection.pdf'),
+]
+
+
+@pytest.fixture(scope='module')
+def retriever():
+    documents = [
+        {
+            'file_name': file_name,
+            'pages': [
+                {'page_number': number, 'text': text}
+                for number, text in enumerate(pages, start=1)
+            ],
+        }
+        for file_name, pages in _PAGES.items()
+    ]
+    
+    vector_store = VectorStore()
+    vector_store.add_chunks(chunk_documents(documents, min_chunk_size=50))
+    return Retriever(vector_store)
+
+
+@pytest.mark.parametrize('query, document', _QUERIES)
+def test_ordinary_queries_pass_default_threshold(retriever, query, document):
+    # Guards RELEVANCE_THRESHOLD against the scale of the TF-IDF scores
+    results = retriever.retrieve(query)
+    
+    assert results, f"No chunk passed the relevance threshold for {query!r}"
+    assert results[0].document == document
@@ -0,0 +1,186 @@
+"""Vector store indexing, search and persistence checks."""
+
+import pytest
+
+from src.processors.text_chunker import Chunk
+from src.search import vector_store as vector_store_module
+from src.search.retriever import Retriever
+from src.search.vector_store import VectorStore
+
+
+_TEXTS = [
+    ('handbook.pdf', "Annual leave is booked through the staff portal at least two weeks ahead."),
+    ('handbook.pdf', "Sick leave must be reported to your line manager before nine o'clock."),
+    ('expenses.pdf', "Travel expenses are reimbursed monthly once receipts are uploaded."),
+    ('expenses.pdf', "Hotel bookings above the nightly limit need approval from finance."),
+]
+
+
+def _chunks(texts):
+    return [
+        Chunk(text, page_number=1, source=document, start_position=0,
+              document=document, chunk_id=number)
+        for number, (document, text) in enumerate(texts)
+    ]
+
+
+def _indexed_store(texts=_TEXTS):
+    vector_store = VectorStore()
+    vector_store.add_chunks(_chunks(texts))
+    return vector_store
+
+
+def test_save_load_round_trip(tmp_path):
+    vector_store = _indexed_store()
+    documents = [{'file_name': 'handbook.pdf'}, {'file_name': 'expenses.pdf'}]
+    vector_store.save(tmp_path, 'corpus-1', documents=documents)
+    
+    assert VectorStore.has_index(tmp_path, 'corpus-1')
+    assert not VectorStore.has_index(tmp_path, 'corpus-2')
+    
+    loaded = VectorStore()
+    loaded.load(tmp_path)
+    
+    assert loaded.is_indexed
+    assert loaded.documents == documents
+    assert [c.to_fields() for c in loaded.chunks] == [c.to_fields() for c in vector_store.chunks]
+    for query in ('how do I book annual leave', 'hotel approval from finance'):
+        assert loaded.search(query, top_k=3) == vector_store.search(query, top_k=3)
+
+
+def test_save_replaces_previous_index(tmp_path):
+    _indexed_store().save(tmp_path, 'corpus-1', documents=[{'file_name': 'old.pdf'}])
+    _indexed_store(_TEXTS[:2]).save(tmp_path, 'corpus-2', documents=[{'file_name': 'new.pdf'}])
+    
+    loaded = VectorStore()
+    loaded.load(tmp_path)
+    
+    assert VectorStore.has_index(tmp_path, 'corpus-2')
+    assert len(loaded.chunks) == 2
+    assert loaded.documents == [{'file_name': 'new.pdf'}]
+
+
+def test_index_with_other_feature_space_is_stale(tmp_path, monkeypatch):
+    _indexed_store().save(tmp_path, 'corpus-1')
+    
+    monkeypatch.setattr(vector_store_module, 'HASH_FEATURES', 2 ** 10)
+    
+    assert not VectorStore.has_index(tmp_path, 'corpus-1')
+
+
+def test_empty_store_is_not_saved(tmp_path):
+    vector_store = VectorStore()
+    vector_store.add_chunks([])
+    
+    assert not vector_store.is_indexed
+    assert vector_store.search('annual leave') == []
+    with pytest.raises(ValueError):
+        vector_store.save(tmp_path, 'corpus-1')
+    assert not VectorStore.has_index(tmp_path, 'corpus-1')
+
+
+# Boilerplate repeated across documents shares one vector row in the store
+_FOOTER = "Questions about this policy go to the people team at head office."
+_SEARCH_TEXTS = _TEXTS + [
+    ('handbook.pdf', _FOOTER),
+    ('expenses.pdf', _FOOTER),
+    ('security.pdf', "Laptops must be locked when left unattended in the office."),
+    ('handbook.pdf', _FOOTER),
+    ('security.pdf', "Report lost badges to reception so they can be disabled."),
+]
+
+_SEARCH_QUERIES = [
+    'how do I book annual leave',
+    'who approves hotel bookings',
+    'questions about the policy for the people team',
+    'lost badge at reception',
+]
+
+# Scores come from int8-quantized rows, so they match float cosine loosely
+_TOLERANCE = 0.02
+
+
+@pytest.fixture(scope='module')
+def search_store():
+    return _indexed_store(_SEARCH_TEXTS)
+
+
+def _brute_force_scores(vector_store, query):
+    """Float cosine of the query against every chunk, without quantization."""
+    texts = [chunk.text for chunk in vector_store.chunks]
+    chunk_vectors = vector_store.tfidf.transform(vector_store.vectorizer.transform(texts))
+    query_vector = vector_store.tfidf.transform(vector_store.vectorizer.transform([query]))
+    return (chunk_vectors @ query_vector.T).toarray().ravel()
+
+
+def _assert_matches_brute_force(results, expected, candidates, k):
+    indices = [idx for idx, _ in results]
+    scores = [score for _, score in results]
+    
+    assert len(results) == min(k, len(candidates))
+    assert len(set(indices)) == len(indices)
+    assert set(indices) <= set(candidates)
+    assert scores == sorted(scores, reverse=True)
+    for idx, score in results:
+        assert score == pytest.approx(expected[idx], abs=_TOLERANCE)
+    
+    # Nothing left out scores higher than what was returned
+    left_out = [expected[idx] for idx in candidates if idx not in indices]
+    if left_out:
+        assert max(left_out) <= min(expected[idx] for idx in indices) + _TOLERANCE
+
+
+@pytest.mark.parametrize('query', _SEARCH_QUERIES)
+@pytest.mark.parametrize('k', [1, 3, 5])
+def test_search_matches_brute_force_cosine(search_store, query, k):
+    expected = _brute_force_scores(search_store, query)
+    results = search_store.search(query, top_k=k)
+    
+    _assert_matches_brute_force(results, expected, range(len(_SEARCH_TEXTS)), k)
+
+
+def test_duplicate_texts_are_returned_together_in_chunk_order(search_store):
+    footers = [idx for idx, (_, text) in enumerate(_SEARCH_TEXTS) if text == _FOOTER]
+    results = search_store.search(_SEARCH_QUERIES[2], top_k=len(footers))
+    
+    assert [idx for idx, _ in results] == footers
+    assert len({score for _, score in results}) == 1
+
+
+@pytest.mark.parametrize('document', ['handbook.pdf', 'expenses.pdf', 'security.pdf'])
+@pytest.mark.parametrize('query', _SEARCH_QUERIES)
+def test_row_mask_matches_brute_force_within_document(search_store, document, query):
+    row_mask = search_store.by_document[document]
+    expected = _brute_force_scores(search_store, query)
+    results = search_store.search(query, top_k=2, row_mask=row_mask)
+    
+    _assert_matches_brute_force(results, expected, row_mask.tolist(), 2)
+
+
+def test_filter_document_only_returns_that_document(search_store):
+    retriever = Retriever(search_store)
+    results = retriever.retrieve(_SEARCH_QUERIES[2], threshold=0.0, filter_document='expenses.pdf')
+    
+    assert results
+    assert {chunk.document for chunk in results} == {'expenses.pdf'}
+    assert retriever.retrieve(_SEARCH_QUERIES[2], filter_document='missing.pdf') == []
+
+
+@pytest.mark.parametrize('document', [None, 'security.pdf'])
+def test_top_k_beyond_matches_pads_with_unmatched_chunks(search_store, document):
+    query = 'lost badge at reception'
+    row_mask = None if document is None else search_store.by_document[document]
+    candidates = range(len(_SEARCH_TEXTS)) if row_mask is None else row_mask.tolist()
+    expected = _brute_force_scores(search_store, query)
+    
+    results = search_store.search(query, top_k=100, row_mask=row_mask)
+    matched = [idx for idx in candidates if expected[idx] > 0]
+    
+    assert 0 < len(matched) < len(candidates)
+    _assert_matches_brute_force(results, expected, candidates, 100)
+    assert {idx for idx, _ in results[:len(matched)]} == set(matched)
+    assert all(score == 0.0 for _, score in results[len(matched):])
+    
+    # A threshold drops the padding again
+    thresholded = search_store.search(query, top_k=100, threshold=0.01, row_mask=row_mask)
+    assert {idx for idx, _ in thresholded} == set(matched)